@@ -1,20 +1,74 @@
 from __future__ import annotations
+import copy
 import inspect
+import json
 import re
+import types
+import weakref
 from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, get_args, get_origin, Annotated
 from dataclasses import dataclass
+from datasette import Response
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from pydantic.json_schema import models_json_schema
+from functools import wraps
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-@dataclass
+
+@dataclass(slots=True)
 class Route:
     path: str
     method: str
     fn: Optional[Callable]
     output: Optional[type]
-    input_schema: Optional[Dict[str, Any]] = None
-    output_schema: Optional[Dict[str, Any]] = None
+    input: Optional[type] = None
+    # OpenAPI fragments precomputed at decoration time by _build_openapi_fragments
+    openapi_path: str = ""
+    # names of the path parameters; _build_operation turns them into fresh
+    # parameter objects for every document
+    openapi_parameters: Tuple[str, ...] = ()
 
 T = TypeVar('T')
+R = TypeVar('R')
+
+# Matches a named group like (?P<name>...) in a route regex
+_NAMED_GROUP_RE = re.compile(r"\(\?P<([^>]+)>[^)]+\)")
+
+# Shared OpenAPI components describing the 422 returned for invalid request bodies
+_ERROR_SCHEMA_NAME = "DatasetteError"
+_ERROR_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "ok": {"type": "boolean"},
+        "error": {"type": "string"},
+        "errors": {"type": "array", "items": {"type": "string"}},
+        "status": {"type": "integer"},
+    },
+    "required": ["ok", "error", "errors", "status"],
+}
+_VALIDATION_ERROR_RESPONSE_NAME = "ValidationError"
+
+# Parameter kinds used by the per-route dispatch plan built in Router._add_route
+_PARAM_REQUEST = 0
+_PARAM_DATASETTE = 1
+_PARAM_SCOPE = 2
+_PARAM_RECEIVE = 3
+_PARAM_SEND = 4
+_PARAM_BODY = 5
+_PARAM_URL_VAR = 6
+
+_INJECTED_PARAMS = {
+    "request": _PARAM_REQUEST,
+    "datasette": _PARAM_DATASETTE,
+    "scope": _PARAM_SCOPE,
+    "receive": _PARAM_RECEIVE,
+    "send": _PARAM_SEND,
+}
+_INJECTED_ARGUMENTS = {kind: name for name, kind in _INJECTED_PARAMS.items()}
+_POSITIONAL_KINDS = (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)
 
 
 class Body:
@@ -36,10 +90,7 @@ class Body:
 
     def __repr__(self) -> str:  # helpful for debugging
         if self.model:
-            try:
-                name = getattr(self.model, "__name__", repr(self.model))
-            except Exception:
-                name = repr(self.model)
+            name = getattr(self.model, "__name__", None) or repr(self.model)
             return f"Body[{name}]"
         return "Body()"
 
@@ -58,98 +109,74 @@ class Router:
 
     def __init__(self, title: str = "API", version: str = "0.0.0", server_url: str = "http://localhost:8001") -> None:
         self._routes: List[Route] = []
-        self.title = title
-        self.version = version
-        self.server_url = server_url
-
-    def POST(self, path: str, *, output: Optional[type] = None):
-        return self._add_route("post", path, output=output)
-
-    def GET(self, path: str, *, output: Optional[type] = None):
-        return self._add_route("get", path, output=output)
+        # routes grouped by OpenAPI path, then method, for document assembly
+        self._routes_by_path: Dict[str, Dict[str, Route]] = {}
+        # routes grouped by regex, then upper-cased HTTP method, for dispatch
+        self._routes_by_pattern: Dict[str, Dict[str, Route]] = {}
+        self._title = title
+        self._version = version
+        self._server_url = server_url
+        # built lazily by routes() and the openapi_* methods, reset by _invalidate_caches()
+        # whenever a route is added or the document metadata below changes
+        self._openapi_cache: Optional[Dict[str, Any]] = None
+        self._openapi_cache_bytes: Optional[bytes] = None
+        self._routes_cache: Optional[List[Tuple[str, Callable]]] = None
+
+    @property
+    def title(self) -> str:
+        return self._title
+
+    @title.setter
+    def title(self, value: str) -> None:
+        self._title = value
+        self._invalidate_caches()
+
+    @property
+    def version(self) -> str:
+        return self._version
+
+    @version.setter
+    def version(self, value: str) -> None:
+        self._version = value
+        self._invalidate_caches()
+
+    @property
+    def server_url(self) -> str:
+        return self._server_url
+
+    @server_url.setter
+    def server_url(self, value: str) -> None:
+        self._server_url = value
+        self._invalidate_caches()
+
+    def POST(self, path: str, *, output: Optional[type] = None, validate_response: bool = False):
+        return self._add_route("post", path, output=output, validate_response=validate_response)
+
+    def GET(self, path: str, *, output: Optional[type] = None, validate_response: bool = False):
+        return self._add_route("get", path, output=output, validate_response=validate_response)
+
+    def _add_route(self, method: str, path: str, *, output: Optional[type], validate_response: bool = False):
+        # `output` only documents the response in the OpenAPI document. The
+        # handler's response body is validated against it only when
+        # validate_response=True is passed.
+        if validate_response and output is None:
+            raise ValueError(f"validate_response=True requires output= for route {path!r}")
 
-    def _add_route(self, method: str, path: str, *, output: Optional[type]):
         def decorator(fn: Callable):
-            # create route entry and compute/store input/output schemas now so
-            # we don't need to keep references to the original function
             entry = Route(path=path, output=output, method=method, fn=None)
-            input_model = None
-            # inspect the handler's annotations for Body[...] parameters or Annotated[..., Body()]
-            try:
-                for _, param in inspect.signature(fn).parameters.items():
-                    # Check for Annotated[Model, Body()] pattern
-                    if get_origin(param.annotation) is Annotated:
-                        args = get_args(param.annotation)
-                        if len(args) >= 2:
-                            # args[0] is the actual type, args[1:] are metadata
-                            for metadata in args[1:]:
-                                if isinstance(metadata, Body):
-                                    input_model = args[0]
-                                    break
-                        if input_model:
-                            break
-                    # Check for backwards-compatible Body[Model] pattern
-                    elif isinstance(param.annotation, Body):
-                        input_model = param.annotation.model
-                        break
-            except Exception:
-                input_model = None
-
-            if input_model is not None:
-                entry.input_schema = _model_to_schema(input_model) or {"type": "object"}
-
-            # determine output schema from explicit `output` if provided
-            if entry.output is not None:
-                entry.output_schema = _model_to_schema(entry.output) or {"type": "object"}
-
-            # append entry after computing schemas
+            # classify each parameter once so the per-request view doesn't
+            # need to re-inspect the handler signature
+            plan = _build_plan(fn)
+            entry.input = next((extra for _, kind, extra in plan if kind == _PARAM_BODY), None)
+
+            _build_openapi_fragments(entry)
+
             self._routes.append(entry)
+            self._routes_by_path.setdefault(entry.openapi_path, {})[entry.method] = entry
+            self._routes_by_pattern.setdefault(entry.path, {})[entry.method.upper()] = entry
+            self._invalidate_caches()
 
-            async def view(request, datasette=None, scope=None, receive=None, send=None):
-                declared_kwargs = inspect.signature(fn).parameters
-                kwargs = {}
-                for name, param in declared_kwargs.items():
-                    if name == "request":
-                        kwargs["request"] = request
-                        continue
-                    elif name == "datasette":
-                        kwargs["datasette"] = datasette
-                        continue
-                    elif name == "scope":
-                        kwargs["scope"] = scope
-                        continue
-                    elif name == "receive":
-                        kwargs["receive"] = receive
-                        continue
-                    elif name == "send":
-                        kwargs["send"] = send
-                        continue
-                    
-                    # Check for Annotated[Model, Body()] pattern
-                    body_model = None
-                    if get_origin(param.annotation) is Annotated:
-                        args = get_args(param.annotation)
-                        if len(args) >= 2:
-                            for metadata in args[1:]:
-                                if isinstance(metadata, Body):
-                                    body_model = args[0]
-                                    break
-                    # Check for backwards-compatible Body[Model] pattern
-                    elif isinstance(param.annotation, Body):
-                        body_model = param.annotation.model
-                    
-                    if body_model is not None:
-                        data = await request.post_body()
-                        model_instance = body_model.model_validate_json(data)  # type: ignore[attr-defined]
-                        kwargs[name] = model_instance
-                        continue
-                    
-                    # see if the str parameter exists in `request.url_vars`.
-                    if param.annotation is str:
-                        kwargs[name] = request.url_vars[name]
-                        continue
-
-                return await fn(**kwargs)
+            view = _compile_view(fn, plan, validate_response=output if validate_response else None)
 
             # replace the stored fn with the wrapper that Datasette should call
             entry.fn = view
@@ -157,17 +184,41 @@ class Router:
 
         return decorator
 
+    def _invalidate_caches(self) -> None:
+        self._openapi_cache = None
+        self._openapi_cache_bytes = None
+        self._routes_cache = None
+
     def routes(self) -> List[Tuple[str, Callable]]:
-        """Return a list of (regex, view_fn) tuples suitable for Datasette's register_routes."""
+        """Return a list of (regex, view_fn) tuples suitable for Datasette's register_routes.
+
+        Routes sharing a regex are registered once, with a view that picks the
+        handler for the request method from a dict.
+
+        The list is assembled once and reused until another route is added.
+        """
+        if self._routes_cache is not None:
+            return list(self._routes_cache)
+
         out: List[Tuple[str, Callable]] = []
-        for entry in self._routes:
-            if entry.fn is not None:
-                out.append((entry.path, entry.fn))
-        return out
+        for methods in self._routes_by_pattern.values():
+            views = {method: entry.fn for method, entry in methods.items() if entry.fn is not None}
+            if views:
+                out.append((next(iter(methods.values())).path, _method_dispatch_view(views)))
+        self._routes_cache = out
+        return list(out)
 
     def openapi_document_json(self) -> Dict[str, Any]:
-        """Return a minimal OpenAPI 3 document as a Python dict."""
-        components_schemas: Dict[str, Any] = {}
+        """Return a minimal OpenAPI 3 document as a Python dict.
+
+        The document is cached until another route is registered or the
+        title, version or server_url is changed.
+        """
+        if self._openapi_cache is not None:
+            return self._openapi_cache
+
+        models = [model for entry in self._routes for model in (entry.input, entry.output) if model is not None]
+        schemas, components_schemas = _pydantic_json_schemas(list(dict.fromkeys(models)))
 
         doc: Dict[str, Any] = {
             "openapi": "3.0.0",
@@ -176,60 +227,440 @@ class Router:
             "paths": {},
         }
 
-        for entry in self._routes:
-            path = entry.path
-            openapi_path = _regex_to_openapi_path(path)
-            method = entry.method.lower()
+        for openapi_path, methods in self._routes_by_path.items():
+            doc["paths"][openapi_path] = {
+                method: _build_operation(entry, schemas, components_schemas) for method, entry in methods.items()
+            }
 
-            parameters: List[Dict[str, Any]] = []
-            for name in _extract_named_groups(path):
-                parameters.append({"name": name, "in": "path", "required": True, "schema": {"type": "string"}})
+        components: Dict[str, Any] = {}
+        if any(entry.input is not None for entry in self._routes):
+            # every operation with a request body shares one 422 response
+            components["responses"] = {
+                _VALIDATION_ERROR_RESPONSE_NAME: _validation_error_component(components_schemas)
+            }
 
-            operation: Dict[str, Any] = {"responses": {"200": {"description": "OK"}}, "parameters": parameters}
+        # Add components.schemas if any models or $defs were collected
+        if components_schemas:
+            components["schemas"] = components_schemas
+        if components:
+            doc["components"] = components
 
-            # Use precomputed schemas stored on the Route entry
-            if entry.input_schema is not None:
-                # Extract $defs and rewrite $refs for OpenAPI 3.0 compatibility
-                processed_schema = _extract_defs_from_schema(entry.input_schema, components_schemas)
-                operation["requestBody"] = {"required": True, "content": {"application/json": {"schema": processed_schema}}}
+        self._openapi_cache = doc
+        return doc
 
-            if entry.output is not None:
-                schema = _model_to_schema(entry.output) or {"type": "object"}
-                # Extract $defs and rewrite $refs for OpenAPI 3.0 compatibility
-                processed_schema = _extract_defs_from_schema(schema, components_schemas)
-                operation["responses"]["200"]["content"] = {"application/json": {"schema": processed_schema}}
+    def openapi_document_bytes(self) -> bytes:
+        """Return the OpenAPI document serialized as JSON bytes.
 
-            doc["paths"].setdefault(openapi_path, {})[method] = operation
+        Serialized once and cached alongside openapi_document_json(), so it can
+        be used directly as a response body.
+        """
+        if self._openapi_cache_bytes is None:
+            self._openapi_cache_bytes = _json_dumps(self.openapi_document_json())
+        return self._openapi_cache_bytes
 
-        # Add components.schemas if any $defs were extracted
-        if components_schemas:
-            doc["components"] = {"schemas": components_schemas}
+def _validation_error_component(components_schemas: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the error schema to components_schemas and return the 422 response referencing it.
 
-        return doc
+    The schema gets a numeric suffix if a user model already has its name, and
+    fresh copies are inserted so editing one document can't leak into others.
+    """
+    name = _unique_component_name(_ERROR_SCHEMA_NAME, components_schemas)
+    components_schemas[name] = copy.deepcopy(_ERROR_SCHEMA)
+    return {
+        "description": "Request body failed validation",
+        "content": {"application/json": {"schema": {"$ref": f"#/components/schemas/{name}"}}},
+    }
 
-def _model_to_schema(model: type) -> Optional[Dict[str, Any]]:
-    if model is None:
+
+def _unique_component_name(name: str, components_schemas: Dict[str, Any]) -> str:
+    """Return `name`, with a numeric suffix if components_schemas already uses it."""
+    candidate = name
+    suffix = 2
+    while candidate in components_schemas:
+        candidate = f"{name}{suffix}"
+        suffix += 1
+    return candidate
+
+
+def _method_dispatch_view(views: Dict[str, Callable]) -> Callable:
+    """Build a view that dispatches to the per-method views registered for one regex.
+
+    HEAD requests fall back to the GET view; any other unregistered method gets
+    a 405 response listing the allowed methods.
+    """
+    views = dict(views)
+    if "GET" in views:
+        views.setdefault("HEAD", views["GET"])
+    allow = ", ".join(views)
+    # the table is private to this view and never changes once built, so its
+    # lookup method can be bound up front
+    get_view = views.get
+
+    async def view(request, datasette=None, scope=None, receive=None, send=None):
+        method_view = get_view(request.method)
+        if method_view is None:
+            return Response.text("Method not allowed", status=405, headers={"Allow": allow})
+        return await method_view(request, datasette, scope, receive, send)
+
+    return _with_cached_signature(view)
+
+
+def _build_openapi_fragments(entry: Route) -> None:
+    """Precompute the parts of the OpenAPI document that only depend on this route."""
+    entry.openapi_path = _regex_to_openapi_path(entry.path)
+
+    entry.openapi_parameters = tuple(re.compile(entry.path).groupindex)
+
+
+def _build_operation(entry: Route, schemas: Dict[Any, Dict[str, Any]], components_schemas: Dict[str, Any]) -> Dict[str, Any]:
+    """Assemble one OpenAPI operation from the route's precomputed fragments."""
+    parameters = [
+        {"name": name, "in": "path", "required": True, "schema": {"type": "string"}}
+        for name in entry.openapi_parameters
+    ]
+    operation: Dict[str, Any] = {"responses": {"200": {"description": "OK"}}, "parameters": parameters}
+
+    if entry.input is not None:
+        schema = _schema_for(entry.input, schemas, components_schemas)
+        operation["requestBody"] = {"required": True, "content": {"application/json": {"schema": schema}}}
+        operation["responses"]["422"] = {"$ref": f"#/components/responses/{_VALIDATION_ERROR_RESPONSE_NAME}"}
+
+    if entry.output is not None:
+        schema = _schema_for(entry.output, schemas, components_schemas)
+        operation["responses"]["200"]["content"] = {"application/json": {"schema": schema}}
+
+    return operation
+
+
+def _schema_for(model: Any, schemas: Dict[Any, Dict[str, Any]], components_schemas: Dict[str, Any]) -> Dict[str, Any]:
+    """Look up a batch-generated pydantic schema, falling back to per-model generation.
+
+    Fallback results are stored in `schemas` so operations sharing a model
+    within one document reuse the same processed schema.
+    """
+    schema = schemas.get(model)
+    if schema is None:
+        schema = _openapi_schema(model, components_schemas)
+        schemas[model] = schema
+    return schema
+
+
+def _pydantic_json_schemas(models: List[Any]) -> Tuple[Dict[Any, Dict[str, Any]], Dict[str, Any]]:
+    """Generate the schemas of all pydantic models in one batch.
+
+    A single schema generator is shared across the models, so nested models
+    are only generated once and every $ref already points into
+    #/components/schemas/. Clashing model names are disambiguated by pydantic.
+    Returns a {model: schema} mapping (each schema a $ref) and the component
+    schemas.
+    """
+    pydantic_models = [model for model in models if isinstance(model, type) and issubclass(model, BaseModel)]
+    if not pydantic_models:
+        return {}, {}
+    try:
+        refs, definitions = models_json_schema(
+            [(model, "validation") for model in pydantic_models],
+            ref_template="#/components/schemas/{model}",
+        )
+    except Exception:
+        # leave these models to the per-model fallback in _schema_for
+        return {}, {}
+    schemas = {model: refs[(model, "validation")] for model in pydantic_models}
+    return schemas, dict(definitions.get("$defs", {}))
+
+
+def _body_model(annotation: Any) -> Optional[type]:
+    """Return the model for a Body[Model] or Annotated[Model, Body()] annotation."""
+    # Check for Annotated[Model, Body()] pattern
+    if get_origin(annotation) is Annotated:
+        args = get_args(annotation)
+        # args[0] is the actual type, args[1:] are metadata
+        for metadata in args[1:]:
+            if isinstance(metadata, Body):
+                return args[0]
         return None
-    mjs = getattr(model, "model_json_schema", None)
-    if callable(mjs):
+    # Check for backwards-compatible Body[Model] pattern
+    if isinstance(annotation, Body):
+        return annotation.model
+    return None
+
+
+def _cache_by_handler(compute: Callable[[Callable], R]) -> Callable[[Callable], R]:
+    """Memoize a per-handler computation, keyed weakly on the handler.
+
+    Entries go away with their handler, so reloaded or test-local handlers
+    aren't kept alive. Handlers that can't be weakly referenced or hashed,
+    such as instances of a dataclass with `async __call__`, are computed
+    without caching.
+    """
+    cache: "weakref.WeakKeyDictionary[Callable, R]" = weakref.WeakKeyDictionary()
+
+    @wraps(compute)
+    def cached(fn: Callable) -> R:
         try:
-            return mjs()  # type: ignore[no-any-return]
-        except Exception:
+            return cache[fn]
+        except (KeyError, TypeError):
             pass
-    schema_fn = getattr(model, "schema", None)
-    if callable(schema_fn):
+        result = compute(fn)
         try:
-            return schema_fn()  # type: ignore[no-any-return]
-        except Exception:
+            cache[fn] = result
+        except TypeError:
             pass
+        return result
+
+    return cached
+
+
+@_cache_by_handler
+def _build_plan(fn: Callable) -> Tuple[Tuple[str, int, Any], ...]:
+    """Classify a handler's parameters into (name, kind, model_or_none) entries.
+
+    All `typing` introspection happens here, at decoration time, so the
+    generated view only ever sees the normalized plan. Cached per handler
+    object, so registering the same handler on several routes or methods
+    classifies it once.
+    """
+    plan: List[Tuple[str, int, Any]] = []
+    for name, annotation, _ in _handler_parameters(fn):
+        if name in _INJECTED_PARAMS:
+            plan.append((name, _INJECTED_PARAMS[name], None))
+            continue
+
+        body_model = _body_model(annotation)
+        if body_model is not None:
+            plan.append((name, _PARAM_BODY, body_model))
+            continue
+
+        # str parameters are looked up in `request.url_vars`.
+        if annotation is str:
+            plan.append((name, _PARAM_URL_VAR, None))
+    return tuple(plan)
+
+
+def _handler_parameters(fn: Callable) -> List[Tuple[str, Any, bool]]:
+    """Return (name, annotation, positional) for each parameter of a handler.
+
+    Plain functions whose annotations hold nothing the router acts on (no
+    Body, Annotated or str) are read straight from their code object, which
+    is much cheaper than building an inspect.Signature.
+    """
+    annotations = getattr(fn, "__annotations__", None)
+    if (
+        isinstance(fn, types.FunctionType)
+        and isinstance(annotations, dict)
+        and not hasattr(fn, "__wrapped__")
+        and not hasattr(fn, "__signature__")
+        and not any(_is_routed_annotation(annotation) for annotation in annotations.values())
+    ):
+        code = fn.__code__
+        names = code.co_varnames[: code.co_argcount + code.co_kwonlyargcount]
+        return [
+            (name, annotations.get(name, inspect.Parameter.empty), i < code.co_argcount)
+            for i, name in enumerate(names)
+        ]
+    return [
+        (param.name, param.annotation, param.kind in _POSITIONAL_KINDS)
+        for param in _signature(fn).parameters.values()
+    ]
+
+
+def _is_routed_annotation(annotation: Any) -> bool:
+    return annotation is str or isinstance(annotation, Body) or get_origin(annotation) is Annotated
+
+
+@_cache_by_handler
+def _signature(fn: Callable) -> inspect.Signature:
+    """Cached `inspect.signature`, shared by every place that inspects a handler."""
+    return inspect.signature(fn)
+
+
+def _json_validator(model: Any) -> Callable[[bytes], Any]:
+    """Return a JSON validator for a request or response body type.
+
+    Called by _compile_view, so each route builds its TypeAdapter once at
+    decoration time and holds it for as long as the route lives. The adapter
+    parses and validates the raw body in pydantic-core, without going through
+    json.loads.
+    """
+    return TypeAdapter(model).validate_json
+
+
+def _compile_view(fn: Callable, plan: Tuple[Tuple[str, int, Any], ...], validate_response: Optional[type] = None) -> Callable:
+    """Generate a view function specialized for a single handler's dispatch plan.
+
+    Each planned parameter becomes one argument in a straight-line call, so the
+    request path runs no loop or kind checks. Arguments are passed positionally
+    wherever the handler signature allows it, avoiding a kwargs dict per call.
+    Given a handler like `async def handler(request, params: Body[Input], name: str)`
+    this emits:
+
+        async def view(request, datasette=None, scope=None, receive=None, send=None):
+            body = await request.post_body()
+            url_vars = request.url_vars
+            try:
+                body_1 = _validate_1(body)
+            except ValidationError as e:
+                return _validation_error_response(e)
+            return await _fn(request, body_1, url_vars['name'])
+
+    When `validate_response` is a type, the handler's response body is also
+    checked against it before being returned.
+    """
+    parameters = _handler_parameters(fn)
+    # the generated code only sees the handler and its body validators; keep
+    # inspect/typing out of this namespace so they never run per request
+    namespace: Dict[str, Any] = {"_fn": fn}
+    lines = ["async def view(request, datasette=None, scope=None, receive=None, send=None):"]
+    kinds = {kind for _, kind, _ in plan}
+    if _PARAM_BODY in kinds:
+        lines.append("    body = await request.post_body()")
+    if _PARAM_URL_VAR in kinds:
+        # request.url_vars is a property; read it once however many path
+        # parameters the handler takes
+        lines.append("    url_vars = request.url_vars")
+    validations: List[str] = []
+    call_args: List[str] = []
+    # positional arguments are only possible until the first handler parameter
+    # the plan skips, or the first keyword-only parameter
+    positional = True
+    for i, (name, kind, extra) in enumerate(plan):
+        if kind == _PARAM_BODY:
+            namespace[f"_validate_{i}"] = _json_validator(extra)
+            validations.append(f"        body_{i} = _validate_{i}(body)")
+            value = f"body_{i}"
+        elif kind == _PARAM_URL_VAR:
+            value = f"url_vars[{name!r}]"
+        else:
+            value = _INJECTED_ARGUMENTS[kind]
+        positional = positional and parameters[i][0] == name and parameters[i][2]
+        call_args.append(value if positional else f"{name}={value}")
+    if validations:
+        namespace["ValidationError"] = ValidationError
+        namespace["_validation_error_response"] = _validation_error_response
+        lines.append("    try:")
+        lines.extend(validations)
+        lines.append("    except ValidationError as e:")
+        lines.append("        return _validation_error_response(e)")
+    if validate_response is None:
+        lines.append(f"    return await _fn({', '.join(call_args)})")
+    else:
+        namespace["_validate_response"] = _json_validator(validate_response)
+        namespace["Response"] = Response
+        namespace["_not_a_response"] = _not_a_response
+        lines.append(f"    response = await _fn({', '.join(call_args)})")
+        lines.append("    if not isinstance(response, Response):")
+        lines.append("        _not_a_response(_fn, response)")
+        lines.append("    _validate_response(response.body)")
+        lines.append("    return response")
+    exec("\n".join(lines), namespace)
+    view = namespace["view"]
+    view.__name__ = getattr(fn, "__name__", view.__name__)
+    view.__qualname__ = getattr(fn, "__qualname__", view.__qualname__)
+    view.__module__ = getattr(fn, "__module__", None)
+    view.__doc__ = getattr(fn, "__doc__", None)
+    return _with_cached_signature(view)
+
+
+def _not_a_response(fn: Callable, response: Any) -> None:
+    """Raise for a handler whose response can't be validated because it isn't a Response."""
+    name = getattr(fn, "__qualname__", repr(fn))
+    raise TypeError(
+        f"{name} must return a datasette Response when validate_response=True, "
+        f"got {type(response).__name__}"
+    )
+
+
+def _validation_error_response(error: ValidationError) -> Response:
+    """422 response for a request body that failed validation, in Datasette's JSON error format."""
+    messages = []
+    for detail in error.errors(include_url=False):
+        location = ".".join(str(part) for part in detail["loc"])
+        messages.append(f"{location}: {detail['msg']}" if location else detail["msg"])
+    return Response.json(
+        {"ok": False, "error": "; ".join(messages), "errors": messages, "status": 422},
+        status=422,
+    )
+
+
+def _with_cached_signature(view: Callable) -> Callable:
+    """Store the view's signature on it as `__signature__`.
+
+    Datasette calls inspect.signature() on route views for every request to
+    decide which arguments to pass; with `__signature__` set that lookup
+    returns immediately instead of rebuilding the Signature.
+    """
+    view.__signature__ = inspect.signature(view)  # type: ignore[attr-defined]
+    return view
+
+
+def _json_dumps(obj: Any) -> bytes:
+    """Serialize to compact JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _model_to_schema(model: type) -> Optional[Dict[str, Any]]:
+    """Build the JSON schema for a model that isn't covered by the pydantic batch.
+
+    The result comes straight from the model (e.g. a pydantic v1 `schema()`
+    classmethod) and may be an object the model hands out every time, so
+    callers must not mutate it.
+    """
+    if model is None:
+        return None
+    resolver = _schema_resolver(model)
+    try:
+        return resolver(model)
+    except Exception:
+        # fall back to a loose schema built from the model's annotations
+        return _schema_from_annotations(model)
+
+
+def _schema_resolver(model: type) -> Callable[[type], Optional[Dict[str, Any]]]:
+    """Pick how to build a schema for this kind of model: pydantic v2, v1 or a plain class."""
+    if callable(getattr(model, "model_json_schema", None)):
+        return _schema_from_model_json_schema
+    if callable(getattr(model, "schema", None)):
+        return _schema_from_schema
+    return _schema_from_annotations
+
+
+def _schema_from_model_json_schema(model: type) -> Dict[str, Any]:
+    return model.model_json_schema()  # type: ignore[attr-defined,no-any-return]
+
+
+def _schema_from_schema(model: type) -> Dict[str, Any]:
+    return model.schema()  # type: ignore[attr-defined,no-any-return]
+
+
+def _schema_from_annotations(model: type) -> Optional[Dict[str, Any]]:
     ann = getattr(model, "__annotations__", None)
     if isinstance(ann, dict):
         return {"type": "object", "properties": {k: {"type": "string"} for k in ann.keys()}}
     return None
 
 
-def _extract_defs_from_schema(schema: Dict[str, Any], components_schemas: Dict[str, Any]) -> Dict[str, Any]:
-    """Extract $defs from a schema, add them to components_schemas, and rewrite $refs.
+def _openapi_schema(model: type, components_schemas: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the schema for a non-batched model, processed for OpenAPI.
+
+    Named object schemas are moved into components_schemas and referenced by
+    $ref, matching how the pydantic batch lays out models. A title that is
+    already taken by another component gets a numeric suffix rather than
+    replacing it.
+    """
+    # Extract $defs and rewrite $refs for OpenAPI 3.0 compatibility
+    schema = _process_schema(_model_to_schema(model) or {"type": "object"}, components_schemas)
+    title = schema.get("title")
+    if schema.get("type") == "object" and isinstance(title, str):
+        name = _unique_component_name(title, components_schemas)
+        components_schemas[name] = schema
+        schema = {"$ref": f"#/components/schemas/{name}"}
+    return schema
+
+
+def _process_schema(schema: Dict[str, Any], components_schemas: Dict[str, Any]) -> Dict[str, Any]:
+    """Move $defs into components_schemas and rewrite $refs, in a single pass.
 
     Pydantic's model_json_schema() generates JSON Schema 2020-12 style with $defs
     for nested model references. OpenAPI 3.0 expects schemas under #/components/schemas/.
@@ -239,42 +670,27 @@ def _extract_defs_from_schema(schema: Dict[str, Any], components_schemas: Dict[s
     if not isinstance(schema, dict):
         return schema
 
-    # Make a copy to avoid mutating the original
-    schema = dict(schema)
-
-    # Extract $defs and add to components_schemas
-    if "$defs" in schema:
-        defs = schema.pop("$defs")
-        for name, definition in defs.items():
-            # Recursively process nested $defs in definitions
-            processed_def = _rewrite_refs(definition)
-            components_schemas[name] = processed_def
-
-    # Rewrite $refs in the schema
-    return _rewrite_refs(schema)
-
-
-def _rewrite_refs(obj: Any) -> Any:
-    """Recursively rewrite $ref values from #/$defs/X to #/components/schemas/X."""
-    if isinstance(obj, dict):
-        result = {}
-        for key, value in obj.items():
-            if key == "$ref" and isinstance(value, str) and value.startswith("#/$defs/"):
-                # Rewrite the ref to point to components/schemas
-                model_name = value[len("#/$defs/"):]
-                result[key] = f"#/components/schemas/{model_name}"
-            else:
-                result[key] = _rewrite_refs(value)
-        return result
-    elif isinstance(obj, list):
-        return [_rewrite_refs(item) for item in obj]
-    else:
-        return obj
-
+    # Make a copy to avoid mutating the original, which may be an object the
+    # model returns on every call. The walk below then works in place.
+    schema = copy.deepcopy(schema)
+
+    stack: List[Any] = [schema]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            defs = current.pop("$defs", None)
+            if isinstance(defs, dict):
+                components_schemas.update(defs)
+            ref = current.get("$ref")
+            if isinstance(ref, str) and ref.startswith("#/$defs/"):
+                current["$ref"] = "#/components/schemas/" + ref[len("#/$defs/"):]
+            stack.extend(current.values())
+            if isinstance(defs, dict):
+                stack.extend(defs.values())
+        elif isinstance(current, list):
+            stack.extend(current)
+    return schema
 
-def _extract_named_groups(regex: str) -> List[str]:
-    pattern = re.compile(regex)
-    return list(pattern.groupindex.keys())
 
 def _regex_to_openapi_path(regex: str) -> str:
     try:
@@ -283,7 +699,7 @@ def _regex_to_openapi_path(regex: str) -> str:
             path = path[1:]
         if path.endswith("$"):
             path = path[:-1]
-        path = re.sub(r"\(\?P<([^>]+)>[^)]+\)", r"{\1}", path)
+        path = _NAMED_GROUP_RE.sub(r"{\1}", path)
         return path
     except Exception:
         return regex
@@ -1,6 +1,7 @@
 from datasette import Response, hookimpl
 from datasette_plugin_router import Router, Body
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+from functools import lru_cache
 from pathlib import Path
 from typing import Annotated
 
@@ -8,6 +9,10 @@ router = Router()
 
 
 class Input(BaseModel):
+    # pydantic's default (extra="ignore") silently drops unknown keys; with
+    # "forbid" a request body carrying extra keys is rejected with a 422
+    model_config = ConfigDict(extra="forbid")
+
     id: int
     name: str
 
@@ -21,11 +26,14 @@ class Output(BaseModel):
 async def demo1(params: Annotated[Input, Body()]):
     # params is now properly typed as Input, not Body[Input]
     # Type checkers will understand params.id is int, params.name is str
-    output = Output(
+    # model_construct skips validation: only safe because these values are
+    # computed here from the already-validated input
+    output = Output.model_construct(
         id_negative=-1 * params.id,
         name_upper=params.name.upper(),
     )
-    return Response.json(output.model_dump())
+    # serialize straight to JSON in pydantic-core, without an intermediate dict
+    return Response(output.model_dump_json(), content_type="application/json; charset=utf-8")
 
 
 @router.GET(r"/-/hello/(?P<name>.*)$")
@@ -38,9 +46,16 @@ def register_routes():
     return router.routes()
 
 
+@lru_cache(maxsize=None)
+def script_js() -> str:
+    # read once per process; not at import time, because `make spec.json`
+    # imports this module before script.js has been built
+    return Path(__file__).parent.joinpath("script.js").read_text()
+
+
 @hookimpl
 def extra_body_script():
     return {
         "module": True,
-        "script": Path(__file__).parent.joinpath("script.js").read_text(),
+        "script": script_js(),
     }
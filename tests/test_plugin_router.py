@@ -1,9 +1,11 @@
+import json
 from datasette.app import Datasette
 import pytest
 from datasette_plugin_router import Router, Body
 from pydantic import BaseModel
 from datasette import hookimpl, Response
 from typing import List, Annotated
+from dataclasses import dataclass
 
 @pytest.mark.asyncio
 async def test_plugin_is_installed():
@@ -28,13 +30,15 @@ async def test_spec(snapshot):
 
     @router.POST("/test", output=Output)
     async def test_endpoint(params: Body[Input]):
-        return Response.json(Output(id_negative=-1 * params.id).model_dump())
+        # values derived from validated input, so validation can be skipped
+        return Response.json(Output.model_construct(id_negative=-1 * params.id).model_dump())
     
     @router.GET(r"/hello/(?P<name>.*)$")
     async def hello(name: str):
         return Response.html(f"<h1>Hello, {name}!</h1>")
     
-    assert router.openapi_document_json() == snapshot(name="router spec")
+    # compare the serialized bytes that get served, not just the dict
+    assert json.loads(router.openapi_document_bytes()) == snapshot(name="router spec")
     
     class TestPlugin:
         __name__ = "TestPlugin"
@@ -50,6 +54,12 @@ async def test_spec(snapshot):
         assert result.status_code == 200
         assert result.json() == {"id_negative": -42}
 
+        result = await datasette.client.post("/test", json={"id": "not-an-int"})
+        assert result.status_code == 422
+        assert result.json()["ok"] is False
+        assert result.json()["status"] == 422
+        assert result.json()["errors"][0].startswith("id: ")
+
     finally:
         datasette.pm.unregister(name="test-plugin")
 
@@ -85,14 +95,25 @@ async def test_nested_pydantic_models_openapi():
     assert "id" in item_schema["properties"]
     assert "title" in item_schema["properties"]
     
-    # Verify the response schema uses the correct $ref
+    # Verify the response schema references the output model in components/schemas
     response_schema = spec["paths"]["/documents"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
-    assert "$defs" not in response_schema, "Should not have $defs in inline schema"
+    assert response_schema == {"$ref": "#/components/schemas/DocumentListOutput"}
+    output_schema = spec["components"]["schemas"]["DocumentListOutput"]
+    assert "$defs" not in output_schema, "Should not have $defs in component schema"
     
     # Verify the $ref points to components/schemas
-    docs_property = response_schema["properties"]["documents"]
+    docs_property = output_schema["properties"]["documents"]
     assert docs_property["items"]["$ref"] == "#/components/schemas/DocumentListItem"
 
+    # A second router sharing the same models still sees the original $defs
+    other = Router()
+
+    @other.GET("/more-documents", output=DocumentListOutput)
+    async def more_documents():
+        return Response.json({"documents": [], "total": 0})
+
+    assert "DocumentListItem" in other.openapi_document_json()["components"]["schemas"]
+
 
 @pytest.mark.asyncio
 async def test_annotated_body_syntax():
@@ -114,7 +135,8 @@ async def test_annotated_body_syntax():
     async def test_endpoint(params: Annotated[Input, Body()]):
         # params is now properly typed as Input, not Body[Input]
         # Type checkers understand params.id is int, params.name is str
-        return Response.json(Output(
+        # model_construct: trusted values derived from validated input
+        return Response.json(Output.model_construct(
             id_negative=-1 * params.id,
             name_upper=params.name.upper()
         ).model_dump())
@@ -142,16 +164,445 @@ async def test_annotated_body_syntax():
         # Should have request body schema
         assert "requestBody" in post_spec
         assert post_spec["requestBody"]["required"] is True
-        request_schema = post_spec["requestBody"]["content"]["application/json"]["schema"]
+        request_ref = post_spec["requestBody"]["content"]["application/json"]["schema"]
+        assert request_ref == {"$ref": "#/components/schemas/Input"}
+        request_schema = spec["components"]["schemas"]["Input"]
         assert "properties" in request_schema
         assert "id" in request_schema["properties"]
         assert "name" in request_schema["properties"]
         
         # Should have response schema
-        response_schema = post_spec["responses"]["200"]["content"]["application/json"]["schema"]
+        response_ref = post_spec["responses"]["200"]["content"]["application/json"]["schema"]
+        assert response_ref == {"$ref": "#/components/schemas/Output"}
+        response_schema = spec["components"]["schemas"]["Output"]
         assert "properties" in response_schema
         assert "id_negative" in response_schema["properties"]
         assert "name_upper" in response_schema["properties"]
 
     finally:
-        datasette.pm.unregister(name="annotated-test-plugin")
\ No newline at end of file
+        datasette.pm.unregister(name="annotated-test-plugin")
+
+@pytest.mark.asyncio
+async def test_handler_arguments():
+    """Test that url_vars, request and datasette are passed to handlers by name."""
+    datasette = Datasette(memory=True)
+
+    class Input(BaseModel):
+        id: int
+
+    router = Router()
+
+    @router.POST(r"/things/(?P<thing_id>[^/]+)/(?P<action>[^/]+)$")
+    async def act(action: str, request, params: Annotated[Input, Body()], thing_id: str, datasette):
+        return Response.json({
+            "thing_id": thing_id,
+            "action": action,
+            "id": params.id,
+            "path": request.path,
+            "has_datasette": datasette is not None,
+        })
+
+    class TestPlugin:
+        __name__ = "ArgumentsTestPlugin"
+
+        @hookimpl
+        def register_routes(datasette):
+            return router.routes()
+
+    try:
+        datasette.pm.register(TestPlugin(), name="arguments-test-plugin")
+
+        result = await datasette.client.post("/things/abc/rename", json={"id": 7})
+        assert result.status_code == 200
+        assert result.json() == {
+            "thing_id": "abc",
+            "action": "rename",
+            "id": 7,
+            "path": "/things/abc/rename",
+            "has_datasette": True,
+        }
+    finally:
+        datasette.pm.unregister(name="arguments-test-plugin")
+
+
+def test_openapi_document_cache_invalidated_by_new_routes():
+    router = Router()
+
+    @router.GET("/one$")
+    async def one():
+        return Response.text("one")
+
+    spec = router.openapi_document_json()
+    assert router.openapi_document_json() is spec
+    assert list(spec["paths"]) == ["/one"]
+
+    @router.GET("/two$")
+    async def two():
+        return Response.text("two")
+
+    assert list(router.openapi_document_json()["paths"]) == ["/one", "/two"]
+
+
+def test_openapi_document_cache_invalidated_by_metadata_changes():
+    router = Router()
+
+    @router.GET("/one$")
+    async def one():
+        return Response.text("one")
+
+    router.openapi_document_bytes()
+    router.title = "Renamed"
+    router.version = "2.0.0"
+    router.server_url = "http://example.com"
+
+    spec = json.loads(router.openapi_document_bytes())
+    assert spec["info"] == {"title": "Renamed", "version": "2.0.0"}
+    assert spec["servers"] == [{"url": "http://example.com"}]
+
+
+def test_editing_a_document_does_not_change_later_documents():
+    router = Router()
+
+    @router.GET(r"/hello/(?P<name>[^/]+)$")
+    async def hello(name: str):
+        return Response.text(name)
+
+    spec = router.openapi_document_json()
+    spec["paths"]["/hello/{name}"]["get"]["parameters"].clear()
+
+    @router.GET("/two$")
+    async def two():
+        return Response.text("two")
+
+    parameters = router.openapi_document_json()["paths"]["/hello/{name}"]["get"]["parameters"]
+    assert parameters == [{"name": "name", "in": "path", "required": True, "schema": {"type": "string"}}]
+
+
+def test_routes_cache_invalidated_by_new_routes():
+    router = Router()
+
+    @router.GET("/one$")
+    async def one():
+        return Response.text("one")
+
+    routes = router.routes()
+    assert router.routes() == routes
+    assert [path for path, _ in routes] == ["/one$"]
+
+    @router.GET("/two$")
+    async def two():
+        return Response.text("two")
+
+    assert [path for path, _ in router.routes()] == ["/one$", "/two$"]
+
+
+def test_openapi_document_bytes():
+    router = Router(title="Bytes API")
+
+    @router.GET(r"/hello/(?P<name>.*)$")
+    async def hello(name: str):
+        return Response.html(f"<h1>Hello, {name}!</h1>")
+
+    spec_bytes = router.openapi_document_bytes()
+    assert router.openapi_document_bytes() is spec_bytes
+    assert json.loads(spec_bytes) == router.openapi_document_json()
+
+
+def test_generated_view_avoids_introspection():
+    """The request path must not reach back into inspect/typing machinery."""
+
+    class Input(BaseModel):
+        id: int
+
+    router = Router()
+
+    @router.POST(r"/items/(?P<item_id>[^/]+)$")
+    async def update(request, item_id: str, params: Annotated[Input, Body()]):
+        return Response.json({})
+
+    # Datasette inspects the view signature per request; it is precomputed
+    assert "__signature__" in vars(update)
+    assert update.__name__ == "update"
+
+    names = set(update.__code__.co_names)
+    assert names.isdisjoint({"inspect", "typing", "signature", "get_origin", "get_args", "isinstance"})
+
+
+def test_shared_models_reuse_processed_schema():
+    class Item(BaseModel):
+        id: int
+
+    router = Router()
+
+    @router.GET("/a$", output=Item)
+    async def a():
+        return Response.json({"id": 1})
+
+    @router.GET("/b$", output=Item)
+    async def b():
+        return Response.json({"id": 2})
+
+    paths = router.openapi_document_json()["paths"]
+    schema_a = paths["/a"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    schema_b = paths["/b"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert schema_a is schema_b
+
+
+@pytest.mark.asyncio
+async def test_methods_share_a_path():
+    """GET and POST handlers on the same regex are dispatched by request method."""
+    datasette = Datasette(memory=True)
+
+    class Input(BaseModel):
+        name: str
+
+    router = Router()
+
+    @router.GET(r"/-/items$")
+    async def list_items():
+        return Response.json({"method": "get"})
+
+    @router.POST(r"/-/items$")
+    async def create_item(params: Annotated[Input, Body()]):
+        return Response.json({"method": "post", "name": params.name})
+
+    assert len(router.routes()) == 1
+
+    class TestPlugin:
+        __name__ = "MethodsTestPlugin"
+
+        @hookimpl
+        def register_routes(datasette):
+            return router.routes()
+
+    try:
+        datasette.pm.register(TestPlugin(), name="methods-test-plugin")
+
+        result = await datasette.client.get("/-/items")
+        assert result.json() == {"method": "get"}
+
+        result = await datasette.client.post("/-/items", json={"name": "x"})
+        assert result.json() == {"method": "post", "name": "x"}
+
+        result = await datasette.client.request("HEAD", "/-/items")
+        assert result.status_code == 200
+
+        result = await datasette.client.request("DELETE", "/-/items")
+        assert result.status_code == 405
+        assert result.headers["allow"] == "GET, POST, HEAD"
+    finally:
+        datasette.pm.unregister(name="methods-test-plugin")
+
+
+@pytest.mark.asyncio
+async def test_validate_response_is_opt_in():
+    datasette = Datasette(memory=True)
+
+    class Output(BaseModel):
+        id: int
+
+    router = Router()
+
+    @router.GET(r"/-/unchecked$", output=Output)
+    async def unchecked():
+        return Response.json({"id": "not-an-int"})
+
+    @router.GET(r"/-/checked$", output=Output, validate_response=True)
+    async def checked():
+        return Response.json({"id": "not-an-int"})
+
+    @router.GET(r"/-/checked-ok$", output=Output, validate_response=True)
+    async def checked_ok():
+        return Response.json({"id": 1})
+
+    class TestPlugin:
+        __name__ = "ValidateResponseTestPlugin"
+
+        @hookimpl
+        def register_routes(datasette):
+            return router.routes()
+
+    try:
+        datasette.pm.register(TestPlugin(), name="validate-response-test-plugin")
+
+        assert (await datasette.client.get("/-/unchecked")).status_code == 200
+        assert (await datasette.client.get("/-/checked")).status_code == 500
+        result = await datasette.client.get("/-/checked-ok")
+        assert result.status_code == 200
+        assert result.json() == {"id": 1}
+    finally:
+        datasette.pm.unregister(name="validate-response-test-plugin")
+
+
+def test_validate_response_requires_output():
+    router = Router()
+    with pytest.raises(ValueError, match="requires output="):
+        router.GET(r"/-/checked$", validate_response=True)
+
+
+@pytest.mark.asyncio
+async def test_validate_response_rejects_non_response():
+    class Output(BaseModel):
+        id: int
+
+    router = Router()
+
+    @router.GET(r"/-/checked$", output=Output, validate_response=True)
+    async def checked():
+        return {"id": 1}
+
+    with pytest.raises(TypeError, match="must return a datasette Response"):
+        await checked(None)
+
+
+def test_error_schema_does_not_replace_user_model():
+    class DatasetteError(BaseModel):
+        code: int
+
+    class Input(BaseModel):
+        id: int
+
+    router = Router()
+
+    @router.POST("/errors$", output=DatasetteError)
+    async def errors(params: Annotated[Input, Body()]):
+        return Response.json({"code": params.id})
+
+    spec = router.openapi_document_json()
+    schemas = spec["components"]["schemas"]
+    post = spec["paths"]["/errors"]["post"]
+
+    user_ref = post["responses"]["200"]["content"]["application/json"]["schema"]["$ref"]
+    assert schemas[user_ref.rsplit("/", 1)[1]]["properties"] == {"code": {"title": "Code", "type": "integer"}}
+
+    error_ref = spec["components"]["responses"]["ValidationError"]["content"]["application/json"]["schema"]["$ref"]
+    assert error_ref != user_ref
+    assert "ok" in schemas[error_ref.rsplit("/", 1)[1]]["properties"]
+
+    # editing one document must not affect documents from other routers
+    schemas[error_ref.rsplit("/", 1)[1]]["properties"].clear()
+    other = Router()
+
+    @other.POST("/other$")
+    async def other_view(params: Annotated[Input, Body()]):
+        return Response.json({})
+
+    assert "ok" in other.openapi_document_json()["components"]["schemas"]["DatasetteError"]["properties"]
+
+
+def test_plain_class_models_use_annotation_schema():
+    class Thing:
+        id: int
+        name: str
+
+    router = Router()
+
+    @router.GET("/things$", output=Thing)
+    async def things():
+        return Response.json({})
+
+    spec = router.openapi_document_json()
+    schema = spec["paths"]["/things"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    # no title, so the schema stays inline rather than going to components
+    assert schema == {"type": "object", "properties": {"id": {"type": "string"}, "name": {"type": "string"}}}
+    assert "components" not in spec
+
+
+def test_non_pydantic_schema_defs_are_hoisted_without_mutation():
+    """Models outside the pydantic batch still get $defs moved into components."""
+    shared_schema = {
+        "title": "Library",
+        "type": "object",
+        "properties": {"books": {"type": "array", "items": {"$ref": "#/$defs/Book"}}},
+        "$defs": {"Book": {"title": "Book", "type": "object", "properties": {"title": {"type": "string"}}}},
+    }
+
+    class Library:
+        # pydantic v1 style: schema() returns the same dict on every call
+        @classmethod
+        def schema(cls):
+            return shared_schema
+
+    router = Router()
+
+    @router.GET("/library$", output=Library)
+    async def library():
+        return Response.json({})
+
+    @router.GET("/library-again$", output=Library)
+    async def library_again():
+        return Response.json({})
+
+    spec = router.openapi_document_json()
+    schemas = spec["components"]["schemas"]
+    first = spec["paths"]["/library"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    second = spec["paths"]["/library-again"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert first == {"$ref": "#/components/schemas/Library"}
+    assert first is second
+    assert "$defs" not in schemas["Library"]
+    assert schemas["Library"]["properties"]["books"]["items"] == {"$ref": "#/components/schemas/Book"}
+    assert schemas["Book"]["properties"] == {"title": {"type": "string"}}
+
+    # the model's own schema dict is left untouched
+    assert "$defs" in shared_schema
+    assert shared_schema["properties"]["books"]["items"] == {"$ref": "#/$defs/Book"}
+
+
+def test_non_pydantic_schema_title_does_not_replace_pydantic_model():
+    class Input(BaseModel):
+        id: int
+
+    class LegacyInput:
+        @classmethod
+        def schema(cls):
+            return {"title": "Input", "type": "object", "properties": {"legacy": {"type": "string"}}}
+
+    router = Router()
+
+    @router.POST("/new$")
+    async def new(params: Body[Input]):
+        return Response.json({})
+
+    @router.GET("/legacy$", output=LegacyInput)
+    async def legacy():
+        return Response.json({})
+
+    spec = router.openapi_document_json()
+    schemas = spec["components"]["schemas"]
+    new_schema = spec["paths"]["/new"]["post"]["requestBody"]["content"]["application/json"]["schema"]
+    legacy_schema = spec["paths"]["/legacy"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert new_schema == {"$ref": "#/components/schemas/Input"}
+    assert legacy_schema == {"$ref": "#/components/schemas/Input2"}
+    assert set(schemas["Input"]["properties"]) == {"id"}
+    assert set(schemas["Input2"]["properties"]) == {"legacy"}
+
+
+@pytest.mark.asyncio
+async def test_callable_instance_handler():
+    """Unhashable callables, like dataclass instances, can still be handlers."""
+    datasette = Datasette(memory=True)
+
+    @dataclass
+    class Greeter:
+        greeting: str
+
+        async def __call__(self, name: str):
+            return Response.text(f"{self.greeting}, {name}")
+
+    router = Router()
+    router.GET(r"/greet/(?P<name>[^/]+)$")(Greeter("Hi"))
+
+    class TestPlugin:
+        __name__ = "CallableTestPlugin"
+
+        @hookimpl
+        def register_routes(datasette):
+            return router.routes()
+
+    try:
+        datasette.pm.register(TestPlugin(), name="callable-test-plugin")
+        result = await datasette.client.get("/greet/sam")
+        assert result.status_code == 200
+        assert result.text == "Hi, sam"
+    finally:
+        datasette.pm.unregister(name="callable-test-plugin")